@@ -3,11 +3,25 @@ import random
 import string
 import logging
 import re
-from telegram import Update, ReplyKeyboardMarkup, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery, Message
+import time
+import math
+import json
+import gzip
+import hashlib
+import signal
+import asyncio
+import resource
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from telegram import Update, User, ReplyKeyboardMarkup, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery, Message
 from telegram.ext import (
-    ApplicationBuilder, CommandHandler, MessageHandler, filters, CallbackQueryHandler, ContextTypes, ConversationHandler
+    ApplicationBuilder, CommandHandler, MessageHandler, filters, CallbackQueryHandler, ContextTypes, ConversationHandler,
+    BaseRateLimiter, TypeHandler, ApplicationHandlerStop
 )
 from telegram.error import NetworkError, BadRequest
+from telegram.helpers import escape_markdown
 from captcha.image import ImageCaptcha
 
 # Set up logging
@@ -34,22 +48,35 @@ else:
     logger.warning("Admin ID not found in environment variables, using hardcoded ID")
 ADMIN_USERNAME = "@Git_Cash_Bot"  # Replace with your Telegram username
 
+# Multi-bot hosting: JSON file listing the bots to run in this process.
+# When unset, a single bot is run from BOT_TOKEN/ADMIN_ID and the defaults below.
+BOTS_CONFIG = os.getenv('BOTS_CONFIG')
+
+# Shared infrastructure used by every hosted bot
+RENDER_WORKERS = int(os.getenv('RENDER_WORKERS', os.cpu_count() or 1))
+OUTBOUND_RATE = float(os.getenv('OUTBOUND_RATE', 30))  # Messages per second, per bot token
+OUTBOUND_CONCURRENCY = int(os.getenv('OUTBOUND_CONCURRENCY', 64))  # In-flight API calls, all bots
+
+# Shutdown and persistence
+STATE_DIR = os.getenv('STATE_DIR', 'state')  # Each bot's state is flushed here on shutdown
+SHUTDOWN_DEADLINE = float(os.getenv('SHUTDOWN_DEADLINE', 10))  # Seconds allowed to drain in-flight work
+STATE_FLUSH_INTERVAL = float(os.getenv('STATE_FLUSH_INTERVAL', 30))  # Seconds between periodic state flushes
+STATE_COMPRESS_LEVEL = int(os.getenv('STATE_COMPRESS_LEVEL', 3))  # gzip level for snapshots; speed over size
+
+# Duplicate update detection: update ids and recent user actions remembered per bot
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv('IDEMPOTENCY_CACHE_SIZE', 10000))  # Update ids kept
+DOUBLE_TAP_CACHE_SIZE = int(os.getenv('DOUBLE_TAP_CACHE_SIZE', 10000))  # Recent user actions kept
+DOUBLE_TAP_WINDOW = float(os.getenv('DOUBLE_TAP_WINDOW', 2))  # Seconds a repeated tap or message is ignored
+
+# Callback data of the admin's approve/reject buttons
+ADMIN_ACTION_PATTERN = r'^(approve|reject)_[0-9]+$'
+
 REWARD_PER_CAPTCHA = 100  # $0.005 per CAPTCHA
 MIN_WITHDRAWAL = 5.00     # Minimum withdrawal amount
 
-# In-memory storage (replace with database in production)
-# WARNING: Data stored here will be lost when the bot restarts.
-user_balances = {}
-active_captchas = {}
-pending_withdrawals = {}  # Store pending withdrawal requests
-user_work_state = {}  # Track user work state
-
 # Conversation states
 WALLET_ADDRESS = 1
 
-# Store user wallet addresses temporarily
-user_withdrawal_state = {}
-
 # Payment method configurations
 PAYMENT_METHODS = {
     'webmoney': {
@@ -94,68 +121,500 @@ PAYMENT_METHODS = {
     }
 }
 
-def get_main_menu(user_id=None):
+# Keys every payment method needs; methods added through BOTS_CONFIG must define all of them
+PAYMENT_METHOD_KEYS = ('name', 'emoji', 'min_withdrawal', 'fee', 'address_pattern', 'address_example')
+
+# Bot names end up in state file names, so keep them to a safe character set
+BOT_NAME_PATTERN = r'^[A-Za-z0-9_-]+$'
+
+# Sliding windows (in seconds) used for the solves-per-minute rate
+SOLVE_RATE_WINDOWS = (60, 300, 900)
+
+# Process-wide counters shown by /stats, shared by every hosted bot
+metrics = {
+    'captchas_rendered': 0,
+    'render_queue': 0,
+    'messages_sent': 0,  # Successful send* calls (messages, photos, ...)
+    'api_calls_in_flight': 0,  # Every paced API call currently running
+}
+
+class IdempotencyCache:
+    """Fixed-size set of recently seen keys, evicting the least recently used.
+
+    With a ttl, a key only counts as a duplicate within ttl seconds of when it was first seen.
+    """
+
+    def __init__(self, max_size: int = IDEMPOTENCY_CACHE_SIZE, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.keys = OrderedDict()  # Key -> time it was first seen
+        self.checked = 0
+        self.duplicates = 0
+
+    def is_duplicate(self, key, now=None) -> bool:
+        """Remember the key and report whether it had been seen before"""
+        now = time.monotonic() if now is None else now
+        self.checked += 1
+        seen_at = self.keys.get(key)
+        if seen_at is not None and (self.ttl is None or now - seen_at < self.ttl):
+            self.keys.move_to_end(key)
+            self.duplicates += 1
+            return True
+        self.keys[key] = now
+        self.keys.move_to_end(key)
+        if len(self.keys) > self.max_size:
+            self.keys.popitem(last=False)
+        return False
+
+class SolveRateCounter:
+    """Solve counts over several sliding windows, kept in one ring of per-second buckets.
+
+    Every window keeps a running total and the position of its oldest bucket, so recording a solve
+    and reading a rate are amortised O(1), and memory is bounded by the longest window in seconds.
+    """
+
+    def __init__(self, windows=SOLVE_RATE_WINDOWS):
+        self.windows = windows
+        self.size = max(windows) + 1
+        self.seconds = [0] * self.size  # Second each bucket covers
+        self.counts = [0] * self.size  # Solves recorded in that second
+        self.end = 0  # Absolute position one past the newest bucket
+        self.starts = {window: 0 for window in windows}  # Absolute position of each window's oldest bucket
+        self.totals = {window: 0 for window in windows}
+
+    def _expire(self, second: int):
+        for window in self.windows:
+            start = self.starts[window]
+            while start < self.end and self.seconds[start % self.size] <= second - window:
+                self.totals[window] -= self.counts[start % self.size]
+                start += 1
+            self.starts[window] = start
+
+    def record(self, now: float):
+        second = int(now)
+        self._expire(second)
+        newest = (self.end - 1) % self.size
+        if self.end and self.seconds[newest] == second:
+            self.counts[newest] += 1
+        else:
+            self.seconds[self.end % self.size] = second
+            self.counts[self.end % self.size] = 1
+            self.end += 1
+        for window in self.windows:
+            self.totals[window] += 1
+
+    def per_minute(self, window: int, now: float) -> float:
+        self._expire(int(now))
+        return self.totals[window] * 60 / window
+
+class BotProfile:
+    """Configuration and user state for one hosted bot token"""
+
+    def __init__(self, name: str, token: str, admin_id: int, reward_per_captcha=REWARD_PER_CAPTCHA,
+                 min_withdrawal=MIN_WITHDRAWAL, payment_methods=None):
+        self.name = name
+        self.token = token
+        self.admin_id = admin_id
+        self.reward_per_captcha = reward_per_captcha
+        self.min_withdrawal = min_withdrawal
+        self.payment_methods = payment_methods if payment_methods is not None else PAYMENT_METHODS
+
+        # In-memory storage (replace with database in production)
+        # Snapshotted to STATE_DIR every STATE_FLUSH_INTERVAL and on graceful shutdown, with admin
+        # decisions journaled in between. A crash loses at most the credits since the last snapshot.
+        self.user_balances = {}
+        self.active_captchas = {}
+        self.pending_withdrawals = {}  # Store pending withdrawal requests
+        self.user_work_state = {}  # Track user work state
+        self.user_withdrawal_state = {}  # Store user wallet addresses temporarily
+        self.journal_seq = 0  # Sequence number of the last journaled admin decision
+
+        # Running aggregates, updated at every mutation so stats never need a full scan
+        self.aggregates = {
+            'outstanding_balance': 0,  # Every user balance, including amounts requested for withdrawal
+            'reserved_balance': 0,  # Part of outstanding_balance requested by pending withdrawals
+            'pending_payouts': {method_id: 0.0 for method_id in self.payment_methods},
+            'active_workers': 0,
+        }
+        self.solve_rate = SolveRateCounter()
+        self.seen_updates = IdempotencyCache()
+        self.recent_actions = IdempotencyCache(max_size=DOUBLE_TAP_CACHE_SIZE, ttl=DOUBLE_TAP_WINDOW)
+
+        # Shutdown bookkeeping: tasks running this bot's handlers, and whether updates are still taken
+        self.update_tasks = weakref.WeakSet()
+        self.accepting_updates = True
+        self.dropped_updates = 0
+
+    def set_balance(self, user_id: int, balance):
+        """Set a user's balance and keep the outstanding total in step"""
+        self.aggregates['outstanding_balance'] += balance - self.user_balances.get(user_id, 0)
+        self.user_balances[user_id] = balance
+
+    def set_work_state(self, user_id: int, active: bool):
+        """Set a user's work state and keep the active worker count in step"""
+        was_active = bool(self.user_work_state.get(user_id))
+        self.user_work_state[user_id] = active
+        self.aggregates['active_workers'] += int(active) - int(was_active)
+
+    def add_pending_withdrawal(self, user_id: int, withdrawal: dict):
+        """Store a withdrawal request, replacing any earlier one from the same user"""
+        self.remove_pending_withdrawal(user_id)
+        self.pending_withdrawals[user_id] = withdrawal
+        self.aggregates['reserved_balance'] += withdrawal['amount']
+        self.aggregates['pending_payouts'][withdrawal['method']] += withdrawal['final_amount']
+
+    def remove_pending_withdrawal(self, user_id: int):
+        """Remove and return a user's withdrawal request, or None if there is none"""
+        withdrawal = self.pending_withdrawals.pop(user_id, None)
+        if withdrawal:
+            self.aggregates['reserved_balance'] -= withdrawal['amount']
+            self.aggregates['pending_payouts'][withdrawal['method']] -= withdrawal['final_amount']
+        return withdrawal
+
+    def record_solve(self, now=None):
+        self.solve_rate.record(time.monotonic() if now is None else now)
+
+    def solves_per_minute(self, window: int, now=None) -> float:
+        return self.solve_rate.per_minute(window, time.monotonic() if now is None else now)
+
+    def to_snapshot(self) -> dict:
+        """Copy the state that must survive a restart; only shallow copies, so cheap on the event loop"""
+        return {
+            'journal_seq': self.journal_seq,
+            'user_balances': dict(self.user_balances),
+            'active_captchas': dict(self.active_captchas),
+            'pending_withdrawals': {
+                user_id: {**withdrawal, 'user': withdrawal['user'].to_dict()}
+                for user_id, withdrawal in self.pending_withdrawals.items()
+            },
+            'user_work_state': dict(self.user_work_state),
+        }
+
+    def restore_snapshot(self, snapshot: dict):
+        """Load state written by to_snapshot, going through the setters so aggregates stay consistent"""
+        self.journal_seq = snapshot['journal_seq']
+        for user_id, balance in snapshot['user_balances'].items():
+            self.set_balance(int(user_id), balance)
+        for user_id, captcha_text in snapshot['active_captchas'].items():
+            self.active_captchas[int(user_id)] = captcha_text
+        for user_id, withdrawal in snapshot['pending_withdrawals'].items():
+            if withdrawal['method'] not in self.payment_methods:
+                # The balance is only cleared on approval, so the user can simply request again
+                logger.warning(f"Dropping pending withdrawal of user {user_id}: unknown method {withdrawal['method']}")
+                continue
+            self.add_pending_withdrawal(int(user_id), {**withdrawal, 'user': User.de_json(withdrawal['user'], None)})
+        for user_id, active in snapshot['user_work_state'].items():
+            if active:
+                self.set_work_state(int(user_id), True)
+
+    def apply_decision(self, record: dict):
+        """Replay a journaled admin decision: the request is gone and the balance is what it set"""
+        self.remove_pending_withdrawal(record['user_id'])
+        self.set_balance(record['user_id'], record['balance'])
+        self.journal_seq = record['seq']
+
+    def check_aggregates(self) -> list:
+        """Compare the running aggregates against a full scan and return any mismatches"""
+        mismatches = []
+        aggregates = self.aggregates
+        expected_balance = sum(self.user_balances.values())
+        if not math.isclose(aggregates['outstanding_balance'], expected_balance, abs_tol=1e-6):
+            mismatches.append(f"outstanding_balance: {aggregates['outstanding_balance']} != {expected_balance}")
+        expected_reserved = sum(w['amount'] for w in self.pending_withdrawals.values())
+        if not math.isclose(aggregates['reserved_balance'], expected_reserved, abs_tol=1e-6):
+            mismatches.append(f"reserved_balance: {aggregates['reserved_balance']} != {expected_reserved}")
+        for method_id in self.payment_methods:
+            expected_payout = sum(
+                w['final_amount'] for w in self.pending_withdrawals.values() if w['method'] == method_id
+            )
+            if not math.isclose(aggregates['pending_payouts'][method_id], expected_payout, abs_tol=1e-6):
+                mismatches.append(
+                    f"pending_payouts[{method_id}]: {aggregates['pending_payouts'][method_id]} != {expected_payout}"
+                )
+        expected_workers = sum(1 for active in self.user_work_state.values() if active)
+        if aggregates['active_workers'] != expected_workers:
+            mismatches.append(f"active_workers: {aggregates['active_workers']} != {expected_workers}")
+        return mismatches
+
+def load_profiles() -> list:
+    """Build the hosted bot profiles from BOTS_CONFIG, or a single one from BOT_TOKEN"""
+    if not BOTS_CONFIG:
+        return [BotProfile('default', str(TOKEN), ADMIN_ID)]
+    with open(BOTS_CONFIG, encoding='utf-8') as config_file:
+        entries = json.load(config_file)
+    profiles = []
+    for index, entry in enumerate(entries):
+        name = entry.get('name', f'bot{index}')
+        # Every branded bot needs its own token and admin; never fall back to the process-wide ones
+        for key in ('token', 'admin_id'):
+            if key not in entry:
+                raise RuntimeError(f"Bot '{name}' in {BOTS_CONFIG} must set '{key}'.")
+        if not re.match(BOT_NAME_PATTERN, name):
+            raise RuntimeError(f"Bot name '{name}' in {BOTS_CONFIG} may only contain letters, digits, '_' and '-'.")
+        if any(profile.name == name for profile in profiles):
+            raise RuntimeError(f"Bot name '{name}' is used more than once in {BOTS_CONFIG}.")
+        if any(profile.token == entry['token'] for profile in profiles):
+            raise RuntimeError(f"Bot '{name}' reuses the token of another bot in {BOTS_CONFIG}.")
+        payment_methods = PAYMENT_METHODS
+        if 'payment_methods' in entry:
+            # Each entry overrides (or adds to) the default definition of that method
+            payment_methods = {
+                method_id: {**PAYMENT_METHODS.get(method_id, {}), **overrides}
+                for method_id, overrides in entry['payment_methods'].items()
+            }
+            for method_id, method_info in payment_methods.items():
+                missing = [key for key in PAYMENT_METHOD_KEYS if key not in method_info]
+                if missing:
+                    raise RuntimeError(f"Payment method '{method_id}' of bot '{name}' is missing: {', '.join(missing)}")
+                try:
+                    re.compile(method_info['address_pattern'])
+                except re.error as e:
+                    raise RuntimeError(f"Payment method '{method_id}' of bot '{name}' has an invalid address_pattern: {e}")
+        profiles.append(BotProfile(
+            name=name,
+            token=entry['token'],
+            admin_id=int(entry['admin_id']),
+            reward_per_captcha=entry.get('reward_per_captcha', REWARD_PER_CAPTCHA),
+            min_withdrawal=entry.get('min_withdrawal', MIN_WITHDRAWAL),
+            payment_methods=payment_methods,
+        ))
+    return profiles
+
+def state_path(profile: BotProfile) -> str:
+    return os.path.join(STATE_DIR, f'{profile.name}.json.gz')
+
+def journal_path(profile: BotProfile) -> str:
+    return os.path.join(STATE_DIR, f'{profile.name}.journal')
+
+# Snapshots are encoded and compressed off the event loop, on one thread so writes stay in order
+state_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='state-writer')
+
+def write_snapshot(path: str, snapshot: dict):
+    """Write a snapshot as gzipped compact JSON, replacing the previous one atomically; runs on state_pool"""
+    tmp_path = path + '.tmp'
+    # json.dump streams through the pure-Python encoder, so the event loop keeps getting the GIL meanwhile
+    with gzip.open(tmp_path, 'wt', encoding='utf-8', compresslevel=STATE_COMPRESS_LEVEL) as state_file:
+        json.dump(snapshot, state_file, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+async def save_state(profile: BotProfile) -> bool:
+    """Snapshot the profile's state to disk without blocking the event loop"""
+    snapshot = profile.to_snapshot()
+    path = state_path(profile)
+    try:
+        os.makedirs(STATE_DIR, exist_ok=True)
+        await asyncio.get_running_loop().run_in_executor(state_pool, write_snapshot, path, snapshot)
+    except Exception as e:
+        logger.error(f"Bot '{profile.name}': failed to save state: {str(e)}")
+        return False
+    if profile.journal_seq == snapshot['journal_seq']:
+        # No decision was journaled while writing, so the snapshot covers the whole journal
+        try:
+            os.remove(journal_path(profile))
+        except FileNotFoundError:
+            pass
+    logger.debug(f"Bot '{profile.name}': state saved to {path}")
+    return True
+
+def journal_decision(profile: BotProfile, user_id: int, balance):
+    """Durably record an admin decision, so a crash before the next snapshot cannot undo it"""
+    profile.journal_seq += 1
+    record = json.dumps({'seq': profile.journal_seq, 'user_id': user_id, 'balance': balance}, separators=(',', ':'))
+    try:
+        os.makedirs(STATE_DIR, exist_ok=True)
+        # One short line per decision: small enough to write and fsync on the event loop
+        with open(journal_path(profile), 'a', encoding='utf-8') as journal:
+            journal.write(record + '\n')
+            journal.flush()
+            os.fsync(journal.fileno())
+    except Exception as e:
+        logger.error(f"Bot '{profile.name}': failed to journal decision for user {user_id}: {str(e)}")
+
+def load_state(profile: BotProfile) -> bool:
+    """Restore the last snapshot and replay newer journaled decisions; returns False when there is neither"""
+    path = state_path(profile)
+    restored = os.path.exists(path)
+    if restored:
+        with gzip.open(path, 'rt', encoding='utf-8') as state_file:
+            profile.restore_snapshot(json.load(state_file))
+    replayed = 0
+    if os.path.exists(journal_path(profile)):
+        restored = True
+        with open(journal_path(profile), encoding='utf-8') as journal:
+            for line in journal:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # A write cut short by a crash
+                if record['seq'] > profile.journal_seq:
+                    profile.apply_decision(record)
+                    replayed += 1
+    if restored:
+        logger.info(
+            f"Bot '{profile.name}': state restored from {STATE_DIR} "
+            f"({len(profile.user_balances)} balances, {replayed} journaled decision(s) replayed)"
+        )
+    return restored
+
+# CAPTCHA rendering is CPU-bound, so every hosted bot shares one pool of render threads
+render_pool = ThreadPoolExecutor(max_workers=RENDER_WORKERS, thread_name_prefix='captcha-render')
+_render_local = threading.local()
+
+def render_captcha(captcha_text: str) -> bytes:
+    """Render a CAPTCHA image to PNG bytes; runs on a render pool thread"""
+    image = getattr(_render_local, 'image', None)
+    if image is None:
+        image = _render_local.image = ImageCaptcha()
+    return image.generate(captcha_text).getvalue()
+
+def warm_render_pool():
+    """Render a throwaway CAPTCHA per worker so fonts are loaded before the first user arrives"""
+    for _ in range(RENDER_WORKERS):
+        render_pool.submit(render_captcha, 'WARMUP')
+
+class OutboundScheduler:
+    """Paces outbound API calls per bot token and caps in-flight calls across all bots"""
+
+    def __init__(self, rate: float = OUTBOUND_RATE, concurrency: int = OUTBOUND_CONCURRENCY):
+        self.interval = 1 / rate
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.next_slot = {}  # Bot token -> earliest time its next call may start
+
+    async def run(self, bot_token: str, endpoint: str, callback, args, kwargs):
+        now = time.monotonic()
+        slot = max(now, self.next_slot.get(bot_token, now))
+        self.next_slot[bot_token] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+        async with self.semaphore:
+            metrics['api_calls_in_flight'] += 1
+            try:
+                result = await callback(*args, **kwargs)
+            finally:
+                metrics['api_calls_in_flight'] -= 1
+            if endpoint.startswith('send'):
+                metrics['messages_sent'] += 1
+            return result
+
+class ScheduledRateLimiter(BaseRateLimiter):
+    """Rate limiter for one bot that hands its requests to the shared OutboundScheduler"""
+
+    def __init__(self, scheduler: OutboundScheduler, bot_token: str):
+        self.scheduler = scheduler
+        self.bot_token = bot_token
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        if endpoint == 'getUpdates':
+            # Long polling must not hold a send slot or be paced behind outgoing messages
+            return await callback(*args, **kwargs)
+        return await self.scheduler.run(self.bot_token, endpoint, callback, args, kwargs)
+
+def get_profile(context: ContextTypes.DEFAULT_TYPE) -> BotProfile:
+    return context.bot_data['profile']
+
+async def gate_updates(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Track the task handling each update, and drop updates once the shutdown deadline has passed"""
+    profile = get_profile(context)
+    if not profile.accepting_updates:
+        profile.dropped_updates += 1
+        raise ApplicationHandlerStop
+    profile.update_tasks.add(asyncio.current_task())
+
+async def skip_duplicate_updates(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Stop redelivered updates and repeated button taps before any other handler sees them"""
+    profile = get_profile(context)
+    query = update.callback_query
+    # A double tap arrives as a second update with its own id, so it is keyed by what the user did.
+    # Callback data is at most 64 bytes; message text can be 4096 characters, so only a digest is kept.
+    action = None
+    if query and query.from_user and query.message:
+        action = (query.from_user.id, query.message.message_id, query.data)
+    elif update.message and update.effective_user:
+        text_digest = hashlib.blake2b((update.message.text or '').encode(), digest_size=8).digest()
+        action = (update.effective_user.id, text_digest)
+    if profile.seen_updates.is_duplicate(update.update_id):
+        logger.info(f"Bot '{profile.name}': skipping redelivered update {update.update_id}")
+    elif action and profile.recent_actions.is_duplicate(action):
+        logger.info(f"Bot '{profile.name}': skipping repeated action in update {update.update_id}")
+    else:
+        return
+    if query:
+        try:
+            await query.answer()
+        except Exception:
+            pass  # Already answered by the original delivery
+    raise ApplicationHandlerStop
+
+def get_main_menu(profile: BotProfile, user_id=None):
     """Create the main reply keyboard menu"""
     buttons = []
-    if user_id and user_id in user_work_state and user_work_state[user_id]:
+    if user_id and user_id in profile.user_work_state and profile.user_work_state[user_id]:
         # Only show Stop Work and New Captcha buttons when work is active
         buttons.append(["⏹️ Stop Work", "🔄 New Captcha"])
     else:
         buttons.append(["▶️ Start Work", "📊 My Balance"])
         buttons.append(["💳 Withdraw", "ℹ️ Help"])
         buttons.append(["📋 Withdrawal List"])
-    
+
     return ReplyKeyboardMarkup(buttons, resize_keyboard=True)
 
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle all text messages"""
     if not update.message or not update.effective_user or update.message.text is None:
         return
+    profile = get_profile(context)
     text = update.message.text
     user_id = update.effective_user.id
 
     if text == "▶️ Start Work":
-        user_work_state[user_id] = True
+        profile.set_work_state(user_id, True)
         await update.message.reply_text(
             "⏳ Waiting for captcha...",
-            reply_markup=get_main_menu(user_id)
+            reply_markup=get_main_menu(profile, user_id)
         )
-        await start_work(update, user_id)
+        await start_work(update, profile, user_id)
     elif text == "⏹️ Stop Work":
-        user_work_state[user_id] = False
-        if user_id in active_captchas:
-            del active_captchas[user_id]
+        profile.set_work_state(user_id, False)
+        if user_id in profile.active_captchas:
+            del profile.active_captchas[user_id]
         await update.message.reply_text(
             "⏹️ Work session stopped!",
-            reply_markup=get_main_menu(user_id)
+            reply_markup=get_main_menu(profile, user_id)
         )
     elif text == "🔄 New Captcha":
-        if user_id in user_work_state and user_work_state[user_id]:
+        if user_id in profile.user_work_state and profile.user_work_state[user_id]:
             await update.message.reply_text(
                 "⏳ Waiting for captcha...",
-                reply_markup=get_main_menu(user_id)
+                reply_markup=get_main_menu(profile, user_id)
             )
-            await send_captcha(update, user_id)
+            await send_captcha(update, profile, user_id)
         else:
             await update.message.reply_text(
                 "❌ Please start work first!",
-                reply_markup=get_main_menu(user_id)
+                reply_markup=get_main_menu(profile, user_id)
             )
     elif text == "📊 My Balance":
-        await show_balance(update, user_id)
+        await show_balance(update, profile, user_id)
     elif text == "💳 Withdraw":
-        await handle_withdraw(update, user_id)
+        await handle_withdraw(update, profile, user_id)
     elif text == "ℹ️ Help":
-        await show_help(update)
+        await show_help(update, profile)
     elif text == "📋 Withdrawal List":
-        await show_withdrawal_list(update, user_id)
-    elif user_id in active_captchas:
+        await show_withdrawal_list(update, profile, user_id)
+    elif user_id in profile.active_captchas:
         await verify_captcha(update, context)
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /start command"""
     if not update.message or not update.effective_user:
         return
+    profile = get_profile(context)
     await update.message.reply_text(
         "🤑 *Welcome to CAPTCHA Earning Bot!*\n\n"
         "Earn real money by solving simple CAPTCHA tasks anytime, anywhere. "
@@ -163,14 +622,14 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "Perfect for students, freelancers, or anyone looking to make extra income on the side.\n"
         "Fast, secure, and user-friendly.\n"
         "Join thousands already earning online with ease.\n\n"
-        f"💰 Current rate: ${REWARD_PER_CAPTCHA:.3f} per CAPTCHA\n"
-        f"💳 Minimum withdrawal: ${MIN_WITHDRAWAL:.2f}\n\n"
+        f"💰 Current rate: ${profile.reward_per_captcha:.3f} per CAPTCHA\n"
+        f"💳 Minimum withdrawal: ${profile.min_withdrawal:.2f}\n\n"
         "✅ Start now and turn your clicks into cash!",
         parse_mode='Markdown',
-        reply_markup=get_main_menu(update.effective_user.id)
+        reply_markup=get_main_menu(profile, update.effective_user.id)
     )
 
-async def show_help(update: Update):
+async def show_help(update: Update, profile: BotProfile):
     """Show help information"""
     if not update.message or not update.effective_user:
         return
@@ -178,61 +637,62 @@ async def show_help(update: Update):
         "▶️ *1. Start Working*\n"
         "Tap Start Work to begin solving CAPTCHAs.\n\n"
         "🧩 *2. Solve CAPTCHAs – Get Paid*\n"
-        f"Each completed CAPTCHA earns you 💰 ${REWARD_PER_CAPTCHA:.3f} – fast and easy!\n\n"
+        f"Each completed CAPTCHA earns you 💰 ${profile.reward_per_captcha:.3f} – fast and easy!\n\n"
         "📊 *3. Check Your Balance*\n"
         "Tap My Balance anytime to see your current earnings.\n\n"
         "💸 *4. Withdraw Your Earnings*\n"
-        f"Once you reach ${MIN_WITHDRAWAL:.2f}, you can request a withdrawal directly in the app.\n\n"
+        f"Once you reach ${profile.min_withdrawal:.2f}, you can request a withdrawal directly in the app.\n\n"
         "📋 *5. Track Your Withdrawals*\n"
         "See all your pending and completed withdrawal requests in the Withdrawal List.",
         parse_mode='Markdown',
-        reply_markup=get_main_menu(update.effective_user.id)
+        reply_markup=get_main_menu(profile, update.effective_user.id)
     )
 
-def generate_captcha(user_id):
+async def generate_captcha(profile: BotProfile, user_id: int) -> bytes:
     """Generate a new CAPTCHA challenge"""
     captcha_text = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
-    image = ImageCaptcha()
-    image_path = f"captcha_{user_id}.png"
-    image.write(captcha_text, image_path)
-    active_captchas[user_id] = captcha_text
-    return image_path
+    metrics['render_queue'] += 1
+    try:
+        image_data = await asyncio.get_running_loop().run_in_executor(render_pool, render_captcha, captcha_text)
+    finally:
+        metrics['render_queue'] -= 1
+    metrics['captchas_rendered'] += 1
+    profile.active_captchas[user_id] = captcha_text
+    return image_data
 
-async def start_work(update: Update, user_id: int):
-    await send_captcha(update, user_id)
+async def start_work(update: Update, profile: BotProfile, user_id: int):
+    await send_captcha(update, profile, user_id)
 
-async def send_captcha(update: Update, user_id: int):
+async def send_captcha(update: Update, profile: BotProfile, user_id: int):
     try:
-        image_path = generate_captcha(user_id)
-        with open(image_path, 'rb') as photo:
-            if hasattr(update, 'callback_query') and update.callback_query and update.callback_query.message and isinstance(update.callback_query.message, Message):
-                msg = update.callback_query.message
-                await msg.reply_photo(
-                    photo=photo,
-                    caption=f"Type the characters you see to earn ${REWARD_PER_CAPTCHA:.3f}",
-                    reply_markup=get_main_menu(user_id)
-                )
-            elif update.message and isinstance(update.message, Message):
-                await update.message.reply_photo(
-                    photo=photo,
-                    caption=f"Type the characters you see to earn ${REWARD_PER_CAPTCHA:.3f}",
-                    reply_markup=get_main_menu(user_id)
-                )
-            else:
-                logger.error("Neither update.callback_query.message nor update.message is available.")
-        os.remove(image_path)
+        photo = await generate_captcha(profile, user_id)
+        if hasattr(update, 'callback_query') and update.callback_query and update.callback_query.message and isinstance(update.callback_query.message, Message):
+            msg = update.callback_query.message
+            await msg.reply_photo(
+                photo=photo,
+                caption=f"Type the characters you see to earn ${profile.reward_per_captcha:.3f}",
+                reply_markup=get_main_menu(profile, user_id)
+            )
+        elif update.message and isinstance(update.message, Message):
+            await update.message.reply_photo(
+                photo=photo,
+                caption=f"Type the characters you see to earn ${profile.reward_per_captcha:.3f}",
+                reply_markup=get_main_menu(profile, user_id)
+            )
+        else:
+            logger.error("Neither update.callback_query.message nor update.message is available.")
     except Exception as e:
         logger.error(f"Error sending CAPTCHA: {str(e)}")
         if hasattr(update, 'callback_query') and update.callback_query and update.callback_query.message and isinstance(update.callback_query.message, Message):
             msg = update.callback_query.message
             await msg.reply_text(
                 "❌ Error generating CAPTCHA. Please try again.",
-                reply_markup=get_main_menu(user_id)
+                reply_markup=get_main_menu(profile, user_id)
             )
         elif update.message and isinstance(update.message, Message):
             await update.message.reply_text(
                 "❌ Error generating CAPTCHA. Please try again.",
-                reply_markup=get_main_menu(user_id)
+                reply_markup=get_main_menu(profile, user_id)
             )
         else:
             logger.error("Could not send error message as no valid update.message or callback_query.message was found.")
@@ -240,76 +700,71 @@ async def send_captcha(update: Update, user_id: int):
 async def verify_captcha(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not update.message or not update.effective_user or update.message.text is None:
         return
+    profile = get_profile(context)
     user_id = update.effective_user.id
     user_answer = update.message.text.upper()
-    correct_answer = active_captchas.get(user_id)
+    correct_answer = profile.active_captchas.get(user_id)
 
     if user_answer == correct_answer:
-        user_balances[user_id] = user_balances.get(user_id, 0) + REWARD_PER_CAPTCHA
-        del active_captchas[user_id]
+        profile.set_balance(user_id, profile.user_balances.get(user_id, 0) + profile.reward_per_captcha)
+        profile.record_solve()
+        del profile.active_captchas[user_id]
         await update.message.reply_text(
-            f"✅ Correct! You earned ${REWARD_PER_CAPTCHA:.3f}",
-            reply_markup=get_main_menu(user_id)
+            f"✅ Correct! You earned ${profile.reward_per_captcha:.3f}",
+            reply_markup=get_main_menu(profile, user_id)
         )
         await update.message.reply_text(
             "⏳ Waiting for captcha...",
-            reply_markup=get_main_menu(user_id)
+            reply_markup=get_main_menu(profile, user_id)
         )
-        await send_captcha(update, user_id)
+        await send_captcha(update, profile, user_id)
     else:
         await update.message.reply_text(
             "❌ Incorrect. Try again.",
-            reply_markup=get_main_menu(user_id)
+            reply_markup=get_main_menu(profile, user_id)
         )
 
-async def show_balance(update: Update, user_id: int):
+async def show_balance(update: Update, profile: BotProfile, user_id: int):
     if not update.message:
         return
-    balance = user_balances.get(user_id, 0)
+    balance = profile.user_balances.get(user_id, 0)
     await update.message.reply_text(
         f"💰 *Your Balance*\n\n"
         f"Current Balance: ${balance:.3f}\n"
-        f"Minimum Withdrawal: ${MIN_WITHDRAWAL:.2f}",
+        f"Minimum Withdrawal: ${profile.min_withdrawal:.2f}",
         parse_mode='Markdown',
         reply_markup=InlineKeyboardMarkup([
             [InlineKeyboardButton("💳 Withdraw", callback_data='show_withdrawal')]
         ])
     )
 
-async def handle_withdraw(update: Update, user_id: int):
+async def handle_withdraw(update: Update, profile: BotProfile, user_id: int):
     if not update.message:
         return
-    balance = user_balances.get(user_id, 0)
-    if balance >= MIN_WITHDRAWAL:
+    balance = profile.user_balances.get(user_id, 0)
+    if balance >= profile.min_withdrawal:
         await update.message.reply_text(
             "Select withdrawal method:",
-            reply_markup=get_withdrawal_menu()
+            reply_markup=get_withdrawal_menu(profile)
         )
     else:
         await update.message.reply_text(
             "❌ Minimum withdrawal is ${:.2f}\n"
-            "Your balance: ${:.3f}".format(MIN_WITHDRAWAL, balance)
+            "Your balance: ${:.3f}".format(profile.min_withdrawal, balance)
         )
 
-def validate_wallet_address(address: str, wallet_type: str) -> bool:
-    if wallet_type not in PAYMENT_METHODS:
+def validate_wallet_address(profile: BotProfile, address: str, wallet_type: str) -> bool:
+    if wallet_type not in profile.payment_methods:
         return False
-    pattern = PAYMENT_METHODS[wallet_type]['address_pattern']
+    pattern = profile.payment_methods[wallet_type]['address_pattern']
     return bool(re.match(pattern, address))
 
-def get_withdrawal_menu():
+def get_withdrawal_menu(profile: BotProfile):
     buttons = []
     header_text = "💳 Select Payment Method 💳"
     buttons.append([InlineKeyboardButton(header_text, callback_data='header_none')])
-    method_buttons = [
-        ("webmoney", "💰 Webmoney"),
-        ("payeer", "💳 Payeer"),
-        ("airtm", "✈️ AirTM"),
-        ("bitcoincash", "💎 Bitcoin Cash"),
-        ("usdttrc20", "💲 USDT TRC20")
-    ]
-    for method_id, button_text in method_buttons:
-        buttons.append([InlineKeyboardButton(button_text, callback_data=f'withdraw_{method_id}')])
+    for method_id, info in profile.payment_methods.items():
+        buttons.append([InlineKeyboardButton(f"{info['emoji']} {info['name']}", callback_data=f'withdraw_{method_id}')])
     buttons.append([
         InlineKeyboardButton("❌ Cancel", callback_data='cancel_withdraw'),
         InlineKeyboardButton("ℹ️ Info", callback_data='withdrawal_help')
@@ -321,22 +776,22 @@ def get_captcha_menu():
         [InlineKeyboardButton("🔄 New CAPTCHA", callback_data='new_captcha')]
     ])
 
-async def show_withdrawal_list(update: Update, user_id: int):
+async def show_withdrawal_list(update: Update, profile: BotProfile, user_id: int):
     if not update.message:
         return
-    user_withdrawals = [w for w_id, w in pending_withdrawals.items() if w_id == user_id]
+    user_withdrawals = [w for w_id, w in profile.pending_withdrawals.items() if w_id == user_id]
     if not user_withdrawals:
         await update.message.reply_text(
             "📋 *Withdrawal History*\n\n"
             "You have no pending withdrawal requests.\n\n"
             "💡 To make a withdrawal, click '💳 Withdraw' when your balance reaches the minimum amount.",
             parse_mode='Markdown',
-            reply_markup=get_main_menu(user_id)
+            reply_markup=get_main_menu(profile, user_id)
         )
         return
     message = "📋 *Your Withdrawal Requests*\n\n"
     for withdrawal in user_withdrawals:
-        method_info = PAYMENT_METHODS[withdrawal['method']]
+        method_info = profile.payment_methods[withdrawal['method']]
         status = "⏳ Pending Admin Approval"
         message += (
             f"🔹 *Request Details:*\n"
@@ -350,14 +805,15 @@ async def show_withdrawal_list(update: Update, user_id: int):
     await update.message.reply_text(
         message,
         parse_mode='Markdown',
-        reply_markup=get_main_menu(user_id)
+        reply_markup=get_main_menu(profile, user_id)
     )
 
 async def show_withdrawal_help(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not update.callback_query:
         return
+    profile = get_profile(context)
     help_text = "💳 *Available Payment Methods*\n\n"
-    for method_id, info in PAYMENT_METHODS.items():
+    for method_id, info in profile.payment_methods.items():
         fee_text = "🎁 +10% Bonus" if info['fee'] == -0.10 else "No fee"
         help_text += (
             f"{info['emoji']} *{info['name']}*\n"
@@ -380,17 +836,18 @@ async def show_withdrawal_help(update: Update, context: ContextTypes.DEFAULT_TYP
 async def request_wallet_address(update: Update, context: ContextTypes.DEFAULT_TYPE, payment_method: str):
     if not update.callback_query or not update.callback_query.from_user:
         return
+    profile = get_profile(context)
     query = update.callback_query
     user_id = query.from_user.id
-    user_withdrawal_state[user_id] = {
+    profile.user_withdrawal_state[user_id] = {
         'method': payment_method,
-        'amount': user_balances.get(user_id, 0)
+        'amount': profile.user_balances.get(user_id, 0)
     }
-    method_info = PAYMENT_METHODS[payment_method]
+    method_info = profile.payment_methods[payment_method]
     fee_text = "🎁 +10% Bonus" if method_info['fee'] == -0.10 else "No fee"
     message = (
         f"{method_info['emoji']} *{method_info['name']} Withdrawal*\n\n"
-        f"💰 Your Balance: ${user_balances.get(user_id, 0):.2f}\n"
+        f"💰 Your Balance: ${profile.user_balances.get(user_id, 0):.2f}\n"
         f"📊 Minimum: ${method_info['min_withdrawal']:.2f}\n"
         f"🔄 Fee: {fee_text}\n\n"
         f"📝 Enter your {method_info['name']} address:\n"
@@ -403,15 +860,15 @@ async def request_wallet_address(update: Update, context: ContextTypes.DEFAULT_T
     )
     return WALLET_ADDRESS
 
-def is_admin(user_id: int) -> bool:
-    return user_id == ADMIN_ID
+def is_admin(profile: BotProfile, user_id: int) -> bool:
+    return user_id == profile.admin_id
 
-async def notify_admin_withdrawal(user_id: int, amount: float, method: str, address: str, bot):
+async def notify_admin_withdrawal(profile: BotProfile, user_id: int, amount: float, method: str, address: str, bot):
     try:
-        withdrawal_info = pending_withdrawals[user_id]
+        withdrawal_info = profile.pending_withdrawals[user_id]
         user = withdrawal_info['user']
         original_amount = withdrawal_info['amount']
-        method_info = PAYMENT_METHODS[withdrawal_info['method']]
+        method_info = profile.payment_methods[withdrawal_info['method']]
         fee_text = "🎁 +10% Bonus" if method_info['fee'] == -0.10 else "No fee"
         message = (
             f"🔔 *New Withdrawal Request*\n\n"
@@ -437,7 +894,7 @@ async def notify_admin_withdrawal(user_id: int, amount: float, method: str, addr
             logger.error(f"No bot context found for user {user_id}")
             return False
         await bot.send_message(
-            chat_id=ADMIN_ID,
+            chat_id=profile.admin_id,
             text=message,
             parse_mode='Markdown',
             reply_markup=keyboard
@@ -451,12 +908,13 @@ async def notify_admin_withdrawal(user_id: int, amount: float, method: str, addr
 async def handle_admin_response(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not update.callback_query or not update.callback_query.from_user or not update.callback_query.data:
         return
+    profile = get_profile(context)
     query = update.callback_query
     user_id = query.from_user.id
     data = query.data
     if not isinstance(data, str):
         return
-    if not is_admin(user_id):
+    if not is_admin(profile, user_id):
         await query.answer("You are not authorized to perform this action.", show_alert=True)
         return
     if not data or '_' not in data:
@@ -469,13 +927,14 @@ async def handle_admin_response(update: Update, context: ContextTypes.DEFAULT_TY
         requester_id = int(requester_id)
     except Exception:
         return
-    if requester_id not in pending_withdrawals:
-        await query.edit_message_text("This withdrawal request is no longer valid.")
+    # Take the request before doing anything else, so a repeated or retried decision is a no-op
+    withdrawal_info = profile.remove_pending_withdrawal(requester_id)
+    if not withdrawal_info:
+        await query.answer("This withdrawal request is no longer valid.")
         return
-    withdrawal_info = pending_withdrawals[requester_id]
-    method_info = PAYMENT_METHODS[withdrawal_info['method']]
+    method_info = profile.payment_methods[withdrawal_info['method']]
     if action == 'approve':
-        user_balances[requester_id] = 0
+        profile.set_balance(requester_id, 0)
         message_to_user = (
             f"✅ Your withdrawal request has been approved!\n\n"
             f"💰 *Transaction Details:*\n"
@@ -491,7 +950,7 @@ async def handle_admin_response(update: Update, context: ContextTypes.DEFAULT_TY
             f"🏦 Method: {method_info['emoji']} {method_info['name']}"
         )
     else:
-        user_balances[requester_id] = withdrawal_info['amount']
+        profile.set_balance(requester_id, withdrawal_info['amount'])
         message_to_user = (
             "❌ Your withdrawal request has been rejected by admin.\n"
             "The amount has been returned to your balance."
@@ -502,6 +961,8 @@ async def handle_admin_response(update: Update, context: ContextTypes.DEFAULT_TY
             f"💰 Amount: ${withdrawal_info['amount']:.2f}\n"
             f"🏦 Method: {method_info['emoji']} {method_info['name']}"
         )
+    # Persist the decision right away, so a crash can never bring back a request that was already paid
+    journal_decision(profile, requester_id, profile.user_balances[requester_id])
     await query.edit_message_text(
         text=admin_message,
         parse_mode='Markdown'
@@ -511,54 +972,54 @@ async def handle_admin_response(update: Update, context: ContextTypes.DEFAULT_TY
             chat_id=requester_id,
             text=message_to_user,
             parse_mode='Markdown',
-            reply_markup=get_main_menu(requester_id)
+            reply_markup=get_main_menu(profile, requester_id)
         )
     except Exception as e:
         logger.error(f"Failed to send notification to user {requester_id}: {str(e)}")
-    del pending_withdrawals[requester_id]
 
 async def process_withdrawal_with_address(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not update.message or not update.effective_user or update.message.text is None:
         return False
+    profile = get_profile(context)
     user_id = update.effective_user.id
     if not context or not context.bot:
         logger.error("No bot context available")
         await update.message.reply_text(
             "❌ An error occurred. Please try again later.",
-            reply_markup=get_main_menu(user_id)
+            reply_markup=get_main_menu(profile, user_id)
         )
         return False
     try:
-        method = user_withdrawal_state[user_id]['method']
-        if method not in PAYMENT_METHODS:
+        method = profile.user_withdrawal_state[user_id]['method']
+        if method not in profile.payment_methods:
             await update.message.reply_text("Invalid payment method selected.")
             return False
-        payment_info = PAYMENT_METHODS[method]
-        amount = user_withdrawal_state[user_id]['amount']
+        payment_info = profile.payment_methods[method]
+        amount = profile.user_withdrawal_state[user_id]['amount']
         min_withdrawal = payment_info['min_withdrawal']
         address = update.message.text.strip()
         if amount >= min_withdrawal:
             fee_multiplier = 1 + payment_info['fee']
             final_amount = amount * fee_multiplier
-            pending_withdrawals[user_id] = {
+            profile.add_pending_withdrawal(user_id, {
                 'amount': amount,
                 'final_amount': final_amount,
                 'method': method,
                 'address': address,
                 'user': update.effective_user,
-            }
-            if await notify_admin_withdrawal(user_id, final_amount, payment_info['name'], address, context.bot):
+            })
+            if await notify_admin_withdrawal(profile, user_id, final_amount, payment_info['name'], address, context.bot):
                 await update.message.reply_text(
                     f"✅ Withdrawal request sent to admin\n"
                     f"Amount: ${amount:.3f}\n"
                     f"Method: {payment_info['name']}",
-                    reply_markup=get_main_menu(user_id)
+                    reply_markup=get_main_menu(profile, user_id)
                 )
                 return True
             else:
                 await update.message.reply_text(
                     "❌ Could not process withdrawal. Please try again later.",
-                    reply_markup=get_main_menu(user_id)
+                    reply_markup=get_main_menu(profile, user_id)
                 )
                 return False
         else:
@@ -571,53 +1032,56 @@ async def process_withdrawal_with_address(update: Update, context: ContextTypes.
         logger.error(f"Error processing withdrawal: {str(e)}")
         await update.message.reply_text(
             "❌ An error occurred. Please try again later.",
-            reply_markup=get_main_menu(user_id)
+            reply_markup=get_main_menu(profile, user_id)
         )
         return False
 
 async def handle_wallet_address(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not update.message or not update.effective_user or update.message.text is None:
         return ConversationHandler.END
+    profile = get_profile(context)
     user_id = update.effective_user.id
     address = update.message.text.strip()
-    if user_id not in user_withdrawal_state:
+    if user_id not in profile.user_withdrawal_state:
         await update.message.reply_text("Please start the withdrawal process again.",
-                                    reply_markup=get_main_menu(user_id))
+                                    reply_markup=get_main_menu(profile, user_id))
         return ConversationHandler.END
-    payment_method = user_withdrawal_state[user_id]['method']
-    amount = user_withdrawal_state[user_id]['amount']
-    if not validate_wallet_address(address, payment_method):
-        method_name = PAYMENT_METHODS[payment_method]['name']
+    payment_method = profile.user_withdrawal_state[user_id]['method']
+    amount = profile.user_withdrawal_state[user_id]['amount']
+    if not validate_wallet_address(profile, address, payment_method):
+        method_name = profile.payment_methods[payment_method]['name']
         await update.message.reply_text(
             f"Invalid {method_name} address format. Please try again or cancel.",
             reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("Cancel", callback_data='cancel_withdraw')]])
         )
         return WALLET_ADDRESS
     if await process_withdrawal_with_address(update, context):
-        del user_withdrawal_state[user_id]
-        fee_multiplier = 1 + PAYMENT_METHODS[payment_method]['fee']
+        del profile.user_withdrawal_state[user_id]
+        payment_info = profile.payment_methods[payment_method]
+        fee_multiplier = 1 + payment_info['fee']
         final_amount = amount * fee_multiplier
-        fee_text = "🎁 +10% Bonus" if PAYMENT_METHODS[payment_method]['fee'] == -0.10 else "No fee"
+        fee_text = "🎁 +10% Bonus" if payment_info['fee'] == -0.10 else "No fee"
         await update.message.reply_text(
             f"✅ Withdrawal request submitted!\n"
             f"Amount: ${amount:.2f}\n"
             f"Final Amount: ${final_amount:.2f}\n"
-            f"Method: {PAYMENT_METHODS[payment_method]['name']}\n"
+            f"Method: {payment_info['name']}\n"
             f"Fee: {fee_text}\n"
             f"Address: {address}\n\n"
             f"Please wait for admin approval.",
-            reply_markup=get_main_menu(user_id)
+            reply_markup=get_main_menu(profile, user_id)
         )
     else:
         await update.message.reply_text(
             "❌ Withdrawal failed. Please try again later.",
-            reply_markup=get_main_menu(user_id)
+            reply_markup=get_main_menu(profile, user_id)
         )
     return ConversationHandler.END
 
 async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not update.callback_query or not update.callback_query.from_user or not update.callback_query.data:
         return
+    profile = get_profile(context)
     query = update.callback_query
     user_id = query.from_user.id
     data = query.data
@@ -625,20 +1089,20 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     try:
         if data == 'show_withdrawal':
-            balance = user_balances.get(user_id, 0)
-            if balance >= MIN_WITHDRAWAL:
+            balance = profile.user_balances.get(user_id, 0)
+            if balance >= profile.min_withdrawal:
                 await query.edit_message_text(
                     "Select withdrawal method:",
-                    reply_markup=get_withdrawal_menu()
+                    reply_markup=get_withdrawal_menu(profile)
                 )
             else:
                 await query.answer(
-                    f"Minimum withdrawal is ${MIN_WITHDRAWAL:.2f}. Your balance: ${balance:.3f}",
+                    f"Minimum withdrawal is ${profile.min_withdrawal:.2f}. Your balance: ${balance:.3f}",
                     show_alert=True
                 )
         elif data and isinstance(data, str) and data.startswith('withdraw_'):
             payment_method = data.replace('withdraw_', '')
-            if payment_method in PAYMENT_METHODS:
+            if payment_method in profile.payment_methods:
                 return await request_wallet_address(update, context, payment_method)
         elif data == 'withdrawal_help':
             await show_withdrawal_help(update, context)
@@ -647,7 +1111,7 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         elif data == 'show_withdrawal_menu':
             await query.edit_message_text(
                 "Select withdrawal method:",
-                reply_markup=get_withdrawal_menu()
+                reply_markup=get_withdrawal_menu(profile)
             )
     except Exception as e:
         logger.error(f"Error in handle_callback: {str(e)}")
@@ -655,17 +1119,18 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def test_admin_notification(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not update.message or not update.effective_user:
         return
+    profile = get_profile(context)
     user_id = update.effective_user.id
-    if not is_admin(user_id):
+    if not is_admin(profile, user_id):
         await update.message.reply_text("This command is only available to admins.")
         return
     try:
-        if ADMIN_ID is None:
+        if profile.admin_id is None:
             logger.error("ADMIN_ID is not set, cannot send test notification.")
             await update.message.reply_text("❌ Admin ID is not configured. Cannot send test notification.")
             return
         await context.bot.send_message(
-            chat_id=int(ADMIN_ID),
+            chat_id=int(profile.admin_id),
             text="🔔 *Test Notification*\n\nIf you see this message, admin notifications are working correctly!",
             parse_mode='Markdown'
         )
@@ -674,6 +1139,46 @@ async def test_admin_notification(update: Update, context: ContextTypes.DEFAULT_
         logger.error(f"Error testing admin notification: {str(e)}")
         await update.message.reply_text("❌ Error sending test notification. Check logs for details.")
 
+async def show_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not update.message or not update.effective_user:
+        return
+    profile = get_profile(context)
+    if not is_admin(profile, update.effective_user.id):
+        await update.message.reply_text("This command is only available to admins.")
+        return
+    aggregates = profile.aggregates
+    message = (
+        f"📈 *Bot Statistics ({escape_markdown(profile.name)})*\n\n"
+        f"💰 *User Balances:* ${aggregates['outstanding_balance']:.3f}\n"
+        f"├ Available: ${aggregates['outstanding_balance'] - aggregates['reserved_balance']:.3f}\n"
+        f"└ Requested for Withdrawal: ${aggregates['reserved_balance']:.3f}\n"
+        f"👷 Active Workers: {aggregates['active_workers']}\n\n"
+        f"⏳ *Pending Payouts (after fees):*\n"
+    )
+    for method_id, info in profile.payment_methods.items():
+        message += f"├ {info['emoji']} {info['name']}: ${aggregates['pending_payouts'][method_id]:.2f}\n"
+    message += "\n🧩 *Solves per Minute:*\n"
+    for window in SOLVE_RATE_WINDOWS:
+        message += f"├ Last {window // 60} min: {profile.solves_per_minute(window):.1f}\n"
+    seen_updates = profile.seen_updates
+    recent_actions = profile.recent_actions
+    skipped = seen_updates.duplicates + recent_actions.duplicates
+    duplicate_rate = skipped / seen_updates.checked * 100 if seen_updates.checked else 0
+    message += (
+        f"\n🔁 *Duplicates Skipped:* {skipped} ({duplicate_rate:.1f}% of updates)\n"
+        f"├ Redelivered: {seen_updates.duplicates} ({len(seen_updates.keys)}/{seen_updates.max_size} cached)\n"
+        f"└ Double Taps: {recent_actions.duplicates} ({len(recent_actions.keys)}/{recent_actions.max_size} cached)\n"
+    )
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    message += (
+        f"\n🖥️ *Process (shared by {len(context.application.bot_data['hosted_profiles'])} bots):*\n"
+        f"├ CAPTCHAs Rendered: {metrics['captchas_rendered']} ({metrics['render_queue']} queued)\n"
+        f"├ Messages Sent: {metrics['messages_sent']} ({metrics['api_calls_in_flight']} API calls in flight)\n"
+        f"├ Peak Memory: {usage.ru_maxrss / 1024:.1f} MB\n"
+        f"└ CPU Time: {usage.ru_utime + usage.ru_stime:.1f} s"
+    )
+    await update.message.reply_text(message, parse_mode='Markdown')
+
 async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE):
     logger.warning(f'Update "{update}" caused error "{context.error}"')
     if isinstance(context.error, NetworkError):
@@ -684,23 +1189,35 @@ async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE):
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not update.message or not update.effective_user:
         return ConversationHandler.END
-    await update.message.reply_text("Operation cancelled.", reply_markup=get_main_menu(update.effective_user.id))
+    profile = get_profile(context)
+    await update.message.reply_text("Operation cancelled.", reply_markup=get_main_menu(profile, update.effective_user.id))
     return ConversationHandler.END
 
 async def cancel_withdrawal_conversation(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not update.callback_query or not update.callback_query.from_user:
         return ConversationHandler.END
+    profile = get_profile(context)
     query = update.callback_query
     user_id = query.from_user.id
-    if user_id in user_withdrawal_state:
-        del user_withdrawal_state[user_id]
+    if user_id in profile.user_withdrawal_state:
+        del profile.user_withdrawal_state[user_id]
     await query.edit_message_text("❌ Withdrawal cancelled")
     return ConversationHandler.END
 
-def main():
-    logger.info("Starting bot...")
-    logger.info(f"Admin ID configured as: {ADMIN_ID}")
-    application = ApplicationBuilder().token(str(TOKEN)).build()
+def build_application(profile: BotProfile, scheduler: OutboundScheduler, profiles: list, request=None):
+    """Build the Application for one profile; request replaces the HTTP layer (used by tests and benchmarks)"""
+    builder = (
+        ApplicationBuilder()
+        .token(profile.token)
+        .rate_limiter(ScheduledRateLimiter(scheduler, profile.token))
+    )
+    if request is not None:
+        builder = builder.request(request).get_updates_request(request)
+    application = builder.build()
+    application.bot_data['profile'] = profile
+    application.bot_data['hosted_profiles'] = profiles
+    application.add_handler(TypeHandler(Update, gate_updates), group=-2)
+    application.add_handler(TypeHandler(Update, skip_duplicate_updates), group=-1)
     conv_handler = ConversationHandler(
         entry_points=[CallbackQueryHandler(handle_callback, pattern='^withdraw_')],
         states={
@@ -714,13 +1231,96 @@ def main():
     application.add_handler(conv_handler)
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("testadmin", test_admin_notification))
-    application.add_handler(CallbackQueryHandler(handle_admin_response, pattern='^(approve|reject)_[0-9]+$'))
+    application.add_handler(CommandHandler("stats", show_stats))
+    application.add_handler(CallbackQueryHandler(handle_admin_response, pattern=ADMIN_ACTION_PATTERN))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
     application.add_handler(CallbackQueryHandler(handle_callback))
     application.add_error_handler(error_handler)
-    logger.info("Bot is running...")
-    print(f"Bot is running... Admin ID: {ADMIN_ID}")
-    application.run_polling(drop_pending_updates=True)
+    return application
+
+async def drain_applications(applications: list):
+    """Wait for queued and in-flight updates, then for any outbound sends still running"""
+    await asyncio.gather(*(application.stop() for application in applications if application.running))
+    while metrics['api_calls_in_flight']:
+        await asyncio.sleep(0.05)
+
+async def shutdown_bots(applications: list, profiles: list):
+    """Stop taking updates, drain in-flight work within SHUTDOWN_DEADLINE, then flush state to disk"""
+    for application in applications:
+        if application.updater and application.updater.running:
+            await application.updater.stop()
+    try:
+        await asyncio.wait_for(drain_applications(applications), timeout=SHUTDOWN_DEADLINE)
+    except asyncio.TimeoutError:
+        # Cancelling stop() leaves the update fetcher running, so stop handlers explicitly before the flush
+        queued = sum(application.update_queue.qsize() for application in applications)
+        for profile in profiles:
+            profile.accepting_updates = False
+        tasks = [task for profile in profiles for task in profile.update_tasks if not task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        logger.warning(
+            f"Shutdown deadline of {SHUTDOWN_DEADLINE}s reached: cancelled {len(tasks)} handler task(s), "
+            f"discarded {queued} queued update(s), {metrics['api_calls_in_flight']} API call(s) in flight"
+        )
+    # Handlers never await between a state mutation and its aggregate update, so this is consistent
+    for profile in profiles:
+        if await save_state(profile):
+            logger.info(f"Bot '{profile.name}': state saved to {state_path(profile)}")
+    for application in applications:
+        try:
+            await application.shutdown()
+        except Exception as e:
+            logger.error(f"Error shutting down application: {str(e)}")
+
+async def flush_state_periodically(profiles: list):
+    """Keep the snapshots recent, so a crash restarts from near-current state rather than an old one"""
+    while True:
+        await asyncio.sleep(STATE_FLUSH_INTERVAL)
+        for profile in profiles:
+            await save_state(profile)
+
+async def run_bots(profiles: list, request=None):
+    """Run every hosted bot in this process until SIGINT or SIGTERM, then shut down gracefully"""
+    scheduler = OutboundScheduler()
+    # Updates that arrived while we were down belong to restored sessions, so only drop them on a cold start
+    restored = [load_state(profile) for profile in profiles]
+    applications = [build_application(profile, scheduler, profiles, request) for profile in profiles]
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:
+            pass  # Windows: fall back to KeyboardInterrupt
+    warm_render_pool()
+    flush_task = asyncio.create_task(flush_state_periodically(profiles))
+    try:
+        for application, was_restored in zip(applications, restored):
+            await application.initialize()
+            await application.updater.start_polling(drop_pending_updates=not was_restored)
+            await application.start()
+        logger.info(f"Bot is running... Hosting {len(applications)} bot(s)")
+        print(f"Bot is running... Admin IDs: {', '.join(str(p.admin_id) for p in profiles)}")
+        await stop_event.wait()
+        logger.info("Shutdown requested, draining in-flight work...")
+    finally:
+        flush_task.cancel()
+        await shutdown_bots(applications, profiles)
+
+def main():
+    logger.info("Starting bot...")
+    profiles = load_profiles()
+    for profile in profiles:
+        logger.info(f"Bot '{profile.name}': admin ID configured as {profile.admin_id}")
+    try:
+        asyncio.run(run_bots(profiles))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        render_pool.shutdown(wait=False)
+        state_pool.shutdown(wait=True)
 
 if __name__ == '__main__':
     main()
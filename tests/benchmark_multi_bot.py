@@ -0,0 +1,103 @@
+"""Compare memory and CPU of N bots hosted in one process against N single-bot processes.
+
+Every bot runs the same workload against the stub request layer: a few users start work
+and then solve CAPTCHAs, so each solve renders an image and sends three messages.
+
+    python tests/benchmark_multi_bot.py --bots 4 --solves 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('BOT_TOKEN', '0:BENCH')
+os.environ.setdefault('ADMIN_ID', '1')
+
+from telegram import Update  # noqa: E402
+
+import bot  # noqa: E402
+from stub_request import StubRequest, message_update  # noqa: E402
+
+
+async def drive(application, profile, solves: int, users: int):
+    update_id = 0
+
+    def update(user_id, text):
+        nonlocal update_id
+        update_id += 1
+        return Update.de_json(message_update(update_id, user_id, text), application.bot)
+
+    for user_id in range(1, users + 1):
+        await application.process_update(update(user_id, "▶️ Start Work"))
+    for solve in range(solves):
+        user_id = solve % users + 1
+        await application.process_update(update(user_id, profile.active_captchas[user_id]))
+    assert sum(profile.user_balances.values()) == solves * profile.reward_per_captcha
+
+
+async def host(bot_count: int, solves: int, users: int):
+    scheduler = bot.OutboundScheduler(rate=10000)
+    profiles = [bot.BotProfile(f'bench{index}', f'{index}:BENCH', admin_id=1) for index in range(bot_count)]
+    applications = [bot.build_application(profile, scheduler, profiles, request=StubRequest()) for profile in profiles]
+    for application in applications:
+        await application.initialize()
+    await asyncio.gather(*(
+        drive(application, profile, solves, users) for application, profile in zip(applications, profiles)
+    ))
+    for application in applications:
+        await application.shutdown()
+
+
+def worker(bot_count: int, solves: int, users: int):
+    """Run the workload in this process and print its peak RSS and CPU time as JSON"""
+    asyncio.run(host(bot_count, solves, users))
+    bot.render_pool.shutdown()
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    print(json.dumps({'rss_mb': usage.ru_maxrss / 1024, 'cpu_s': usage.ru_utime + usage.ru_stime}))
+
+
+def spawn(bot_count: int, args) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, __file__, '--worker', '--bots', str(bot_count),
+         '--solves', str(args.solves), '--users', str(args.users)],
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+    )
+
+
+def collect(processes: list) -> dict:
+    results = [json.loads(process.communicate()[0]) for process in processes]
+    return {key: sum(result[key] for result in results) for key in ('rss_mb', 'cpu_s')}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bots', type=int, default=4)
+    parser.add_argument('--solves', type=int, default=200, help='CAPTCHAs solved per bot')
+    parser.add_argument('--users', type=int, default=5, help='Users working per bot')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        worker(args.bots, args.solves, args.users)
+        return
+
+    started = time.monotonic()
+    hosted = collect([spawn(args.bots, args)])
+    hosted_wall = time.monotonic() - started
+    started = time.monotonic()
+    separate = collect([spawn(1, args) for _ in range(args.bots)])
+    separate_wall = time.monotonic() - started
+
+    print(f"{args.bots} bots x {args.solves} solves ({args.users} users each)")
+    print(f"{'':<22}{'RSS (MB)':>10}{'CPU (s)':>10}{'Wall (s)':>10}")
+    print(f"{'one process':<22}{hosted['rss_mb']:>10.1f}{hosted['cpu_s']:>10.2f}{hosted_wall:>10.2f}")
+    print(f"{f'{args.bots} processes':<22}{separate['rss_mb']:>10.1f}{separate['cpu_s']:>10.2f}{separate_wall:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
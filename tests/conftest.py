@@ -0,0 +1,19 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bot  # noqa: E402
+
+
+@pytest.fixture
+def profile():
+    return bot.BotProfile('test', 'TOKEN', admin_id=1)
+
+
+@pytest.fixture(autouse=True)
+def state_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(bot, 'STATE_DIR', str(tmp_path / 'state'))
+    return tmp_path / 'state'
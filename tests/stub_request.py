@@ -0,0 +1,94 @@
+"""In-memory stand-in for the Telegram Bot API, used by the tests and the multi-bot benchmark"""
+import asyncio
+import json
+import time
+from http import HTTPStatus
+
+from telegram.request import BaseRequest
+
+BOT_USER = {'id': 1000, 'is_bot': True, 'first_name': 'Stub', 'username': 'stub_bot'}
+
+
+def message_update(update_id: int, user_id: int, text: str) -> dict:
+    """Build the JSON of a private text message update from user_id"""
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': f'user{user_id}'},
+            'text': text,
+        },
+    }
+
+
+def callback_update(update_id: int, user_id: int, message_id: int, data: str) -> dict:
+    """Build the JSON of user_id tapping an inline button with callback data on a bot message"""
+    return {
+        'update_id': update_id,
+        'callback_query': {
+            'id': f'q{update_id}', 'chat_instance': 'c', 'data': data,
+            'from': {'id': user_id, 'is_bot': False, 'first_name': f'user{user_id}'},
+            'message': {
+                'message_id': message_id, 'date': int(time.time()), 'text': 'request',
+                'chat': {'id': user_id, 'type': 'private'}, 'from': BOT_USER,
+            },
+        },
+    }
+
+
+class StubRequest(BaseRequest):
+    """Answers every API call locally, recording the endpoints that were hit"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = []
+        self.sent_messages = []  # (chat_id, text) of every sendMessage call
+        self.updates = []  # Served by getUpdates, honouring its offset like the real API
+        self.failing = set()  # Endpoints that answer with a Bad Request error
+        self._message_id = 0
+
+    def feed(self, update: dict):
+        self.updates.append(update)
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        endpoint = url.rsplit('/', 1)[-1]
+        self.calls.append(endpoint)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if endpoint in self.failing:
+            error = {'ok': False, 'error_code': 400, 'description': f'Bad Request: {endpoint} failed'}
+            return HTTPStatus.BAD_REQUEST, json.dumps(error).encode()
+        if endpoint == 'getMe':
+            result = BOT_USER
+        elif endpoint == 'getUpdates':
+            # Stand in for long polling without spinning the event loop
+            await asyncio.sleep(0.01)
+            offset = (request_data.parameters.get('offset') if request_data else None) or 0
+            result = [update for update in self.updates if update['update_id'] >= offset]
+        elif endpoint in ('sendMessage', 'sendPhoto'):
+            self._message_id += 1
+            chat_id = int(request_data.parameters['chat_id']) if request_data else 0
+            if endpoint == 'sendMessage':
+                self.sent_messages.append((chat_id, request_data.parameters.get('text')))
+            result = {
+                'message_id': self._message_id,
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'from': BOT_USER,
+            }
+        else:
+            result = True
+        return HTTPStatus.OK, json.dumps({'ok': True, 'result': result}).encode()
@@ -0,0 +1,121 @@
+import random
+
+from telegram import User
+
+import bot
+
+
+def withdrawal(user_id, amount, method='payeer'):
+    fee_multiplier = 1 + bot.PAYMENT_METHODS[method]['fee']
+    return {
+        'amount': amount,
+        'final_amount': amount * fee_multiplier,
+        'method': method,
+        'address': 'P1234567',
+        'user': User(user_id, f'user{user_id}', False, username=f'user{user_id}'),
+    }
+
+
+def test_new_profile_is_consistent(profile):
+    assert profile.check_aggregates() == []
+    assert profile.aggregates['outstanding_balance'] == 0
+    assert profile.aggregates['active_workers'] == 0
+
+
+def test_credits_and_withdrawal_lifecycle(profile):
+    for user_id in (10, 11, 12):
+        profile.set_work_state(user_id, True)
+        for _ in range(3):
+            profile.set_balance(user_id, profile.user_balances.get(user_id, 0) + profile.reward_per_captcha)
+    assert profile.aggregates['outstanding_balance'] == 900
+    assert profile.aggregates['active_workers'] == 3
+
+    # Stop work twice: the second stop must not decrement again
+    profile.set_work_state(12, False)
+    profile.set_work_state(12, False)
+    assert profile.aggregates['active_workers'] == 2
+
+    profile.add_pending_withdrawal(10, withdrawal(10, 300, 'webmoney'))
+    profile.add_pending_withdrawal(11, withdrawal(11, 300))
+    assert profile.aggregates['pending_payouts']['webmoney'] == 270
+    assert profile.aggregates['pending_payouts']['payeer'] == 300
+    assert profile.aggregates['reserved_balance'] == 600
+
+    # Replacing a request moves its amount to the new method
+    profile.add_pending_withdrawal(11, withdrawal(11, 300, 'airtm'))
+    assert profile.aggregates['pending_payouts']['payeer'] == 0
+    assert profile.aggregates['pending_payouts']['airtm'] == 300
+    assert profile.check_aggregates() == []
+
+    # Approve: balance cleared, request removed
+    profile.set_balance(10, 0)
+    profile.remove_pending_withdrawal(10)
+    # Reject: balance restored to the requested amount, request removed
+    profile.set_balance(11, profile.pending_withdrawals[11]['amount'])
+    profile.remove_pending_withdrawal(11)
+    # Removing twice is a no-op
+    profile.remove_pending_withdrawal(11)
+
+    assert profile.aggregates['outstanding_balance'] == 600
+    assert profile.aggregates['reserved_balance'] == 0
+    assert profile.aggregates['pending_payouts']['webmoney'] == 0
+    assert profile.aggregates['pending_payouts']['airtm'] == 0
+    assert profile.check_aggregates() == []
+
+
+def test_check_aggregates_reports_drift(profile):
+    profile.set_balance(10, 500)
+    profile.user_balances[10] = 700
+    profile.user_work_state[11] = True
+    mismatches = profile.check_aggregates()
+    assert len(mismatches) == 2
+    assert mismatches[0].startswith('outstanding_balance')
+    assert mismatches[1].startswith('active_workers')
+
+
+def test_snapshot_round_trip_rebuilds_aggregates(profile):
+    for user_id in range(20):
+        profile.set_balance(user_id, 100 * user_id)
+        profile.set_work_state(user_id, user_id % 3 == 0)
+    profile.add_pending_withdrawal(5, withdrawal(5, 500, 'webmoney'))
+    profile.add_pending_withdrawal(6, withdrawal(6, 600, 'bitcoincash'))
+    profile.active_captchas[7] = 'ABC123'
+
+    restored = bot.BotProfile('test', 'TOKEN', admin_id=1)
+    restored.restore_snapshot(profile.to_snapshot())
+
+    assert restored.check_aggregates() == []
+    assert restored.aggregates == profile.aggregates
+    assert restored.user_balances == profile.user_balances
+    assert restored.active_captchas == {7: 'ABC123'}
+    assert restored.pending_withdrawals[6]['user'].first_name == 'user6'
+
+
+def test_solves_per_minute_window_boundaries(profile):
+    profile.record_solve(now=1000)
+    profile.record_solve(now=1030)
+    assert profile.solves_per_minute(60, now=1059) == 2
+    # A solve expires exactly one window after it was recorded
+    assert profile.solves_per_minute(60, now=1060) == 1
+    assert profile.solves_per_minute(60, now=1090) == 0
+    # Longer windows still hold both solves, scaled to a per-minute rate
+    assert profile.solves_per_minute(300, now=1090) == 2 * 60 / 300
+    assert profile.solves_per_minute(900, now=1899) == 2 * 60 / 900
+    assert profile.solves_per_minute(900, now=1930) == 0
+
+
+def test_solve_rate_matches_a_full_scan():
+    counter = bot.SolveRateCounter()
+    solves = []
+    rng = random.Random(7)
+    now = 1000.0
+    for _ in range(5000):
+        now += rng.expovariate(10)
+        counter.record(now)
+        solves.append(now)
+        if rng.random() < 0.01:
+            for window in bot.SOLVE_RATE_WINDOWS:
+                expected = sum(1 for solved in solves if int(solved) > int(now) - window)
+                assert counter.per_minute(window, now) == expected * 60 / window
+    # Memory is bounded by the longest window, however many solves were recorded
+    assert len(counter.seconds) == max(bot.SOLVE_RATE_WINDOWS) + 1
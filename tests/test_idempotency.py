@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+from telegram import Update
+
+import bot
+from stub_request import StubRequest, callback_update, message_update
+
+ADMIN_ID = 1
+REQUESTER_ID = 5
+
+
+def test_cache_evicts_least_recently_used():
+    cache = bot.IdempotencyCache(max_size=3)
+    assert not cache.is_duplicate(1)
+    assert cache.is_duplicate(1)
+    for key in (2, 3, 4):
+        cache.is_duplicate(key)
+    assert list(cache.keys) == [2, 3, 4]
+    assert not cache.is_duplicate(1)
+    assert (cache.checked, cache.duplicates) == (6, 1)
+
+
+def test_cache_ttl_counts_from_first_sighting():
+    cache = bot.IdempotencyCache(ttl=2)
+    assert not cache.is_duplicate('tap', now=100)
+    assert cache.is_duplicate('tap', now=101)
+    assert cache.is_duplicate('tap', now=101.9)
+    assert not cache.is_duplicate('tap', now=102)
+    assert cache.is_duplicate('tap', now=103)
+
+
+@pytest.fixture
+def withdrawal_profile():
+    profile = bot.BotProfile('dup', '1:DUP', admin_id=ADMIN_ID)
+    profile.set_balance(REQUESTER_ID, 500)
+    profile.add_pending_withdrawal(REQUESTER_ID, {
+        'amount': 500, 'final_amount': 500, 'method': 'payeer', 'address': 'P1234567',
+        'user': bot.User(REQUESTER_ID, 'user5', False),
+    })
+    return profile
+
+
+def run_updates(profile, request, updates):
+    async def run():
+        application = bot.build_application(profile, bot.OutboundScheduler(rate=1000), [profile], request)
+        await application.initialize()
+        for update in updates:
+            await application.process_update(Update.de_json(update, application.bot))
+        await application.shutdown()
+
+    asyncio.run(run())
+
+
+def test_redelivered_answer_is_credited_once(profile):
+    request = StubRequest()
+    profile.set_work_state(100, True)
+    profile.active_captchas[100] = 'ABC123'
+    update = message_update(1, 100, 'ABC123')
+    run_updates(profile, request, [update, update])
+    assert profile.user_balances[100] == profile.reward_per_captcha
+    assert request.calls.count('sendPhoto') == 1
+    assert profile.seen_updates.duplicates == 1
+
+
+def test_double_tap_renders_one_captcha(profile):
+    request = StubRequest()
+    run_updates(profile, request, [
+        message_update(1, 100, "▶️ Start Work"),
+        message_update(2, 100, "▶️ Start Work"),
+    ])
+    assert request.calls.count('sendPhoto') == 1
+    assert profile.recent_actions.duplicates == 1
+
+
+def test_double_tap_key_does_not_keep_message_text(profile):
+    text = 'x' * 4096
+    run_updates(profile, StubRequest(), [message_update(1, 100, text), message_update(2, 100, text)])
+    assert profile.recent_actions.duplicates == 1
+    (user_id, digest), = profile.recent_actions.keys
+    assert user_id == 100 and len(digest) == 8
+
+
+def test_admin_double_tap_is_processed_once(withdrawal_profile):
+    request = StubRequest()
+    run_updates(withdrawal_profile, request, [
+        callback_update(1, ADMIN_ID, 7, f'approve_{REQUESTER_ID}'),
+        callback_update(2, ADMIN_ID, 7, f'approve_{REQUESTER_ID}'),
+    ])
+    assert withdrawal_profile.user_balances[REQUESTER_ID] == 0
+    assert request.calls.count('editMessageText') == 1
+    assert withdrawal_profile.check_aggregates() == []
+
+
+def test_failed_decision_leaves_consistent_state_and_retry_is_noop(withdrawal_profile):
+    request = StubRequest()
+    request.failing.add('editMessageText')
+    run_updates(withdrawal_profile, request, [callback_update(1, ADMIN_ID, 7, f'approve_{REQUESTER_ID}')])
+    assert withdrawal_profile.pending_withdrawals == {}
+    assert withdrawal_profile.user_balances[REQUESTER_ID] == 0
+
+    # The admin retries from another message: nothing is paid or restored twice
+    request.failing.clear()
+    run_updates(withdrawal_profile, request, [callback_update(2, ADMIN_ID, 8, f'reject_{REQUESTER_ID}')])
+    assert withdrawal_profile.user_balances[REQUESTER_ID] == 0
+    assert withdrawal_profile.pending_withdrawals == {}
+    assert request.calls.count('answerCallbackQuery') == 1
+    assert withdrawal_profile.check_aggregates() == []
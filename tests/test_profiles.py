@@ -0,0 +1,93 @@
+import asyncio
+import json
+
+import pytest
+
+from telegram import Update
+
+import bot
+from stub_request import StubRequest, message_update
+
+
+def write_config(tmp_path, monkeypatch, entries):
+    config_path = tmp_path / 'bots.json'
+    config_path.write_text(json.dumps(entries))
+    monkeypatch.setattr(bot, 'BOTS_CONFIG', str(config_path))
+
+
+def test_single_bot_without_config(monkeypatch):
+    monkeypatch.setattr(bot, 'BOTS_CONFIG', None)
+    profiles = bot.load_profiles()
+    assert [profile.name for profile in profiles] == ['default']
+    assert profiles[0].payment_methods is bot.PAYMENT_METHODS
+
+
+def test_profiles_get_their_own_config_and_state(tmp_path, monkeypatch):
+    write_config(tmp_path, monkeypatch, [
+        {'name': 'alpha', 'token': 'A', 'admin_id': 1, 'reward_per_captcha': 0.01},
+        {'token': 'B', 'admin_id': 2, 'payment_methods': {'payeer': {'fee': 0.05}}},
+    ])
+    alpha, second = bot.load_profiles()
+    assert (alpha.name, alpha.reward_per_captcha) == ('alpha', 0.01)
+    assert (second.name, second.admin_id) == ('bot1', 2)
+    assert list(second.payment_methods) == ['payeer']
+    assert second.payment_methods['payeer']['fee'] == 0.05
+    assert second.payment_methods['payeer']['name'] == 'Payeer'
+    alpha.set_balance(5, 100)
+    assert second.user_balances == {}
+
+
+@pytest.mark.parametrize('entries, message', [
+    ([{'name': 'a', 'admin_id': 1}], "must set 'token'"),
+    ([{'name': 'a', 'token': 'A'}], "must set 'admin_id'"),
+    ([{'name': 'a', 'token': 'A', 'admin_id': 1}, {'name': 'a', 'token': 'B', 'admin_id': 1}], 'more than once'),
+    ([{'name': 'bot1', 'token': 'A', 'admin_id': 1}, {'token': 'B', 'admin_id': 1}], 'more than once'),
+    ([{'name': 'a', 'token': 'A', 'admin_id': 1}, {'name': 'b', 'token': 'A', 'admin_id': 1}], 'reuses the token'),
+    ([{'name': '../a', 'token': 'A', 'admin_id': 1}], 'may only contain'),
+    ([{'token': 'A', 'admin_id': 1, 'payment_methods': {'paypal': {'name': 'PayPal'}}}],
+     'missing: emoji, min_withdrawal'),
+    ([{'token': 'A', 'admin_id': 1, 'payment_methods': {'payeer': {'address_pattern': '('}}}],
+     'invalid address_pattern'),
+])
+def test_invalid_config_is_rejected(tmp_path, monkeypatch, entries, message):
+    write_config(tmp_path, monkeypatch, entries)
+    with pytest.raises(RuntimeError, match=message):
+        bot.load_profiles()
+
+
+def test_scheduler_counts_only_successful_sends(monkeypatch):
+    monkeypatch.setitem(bot.metrics, 'messages_sent', 0)
+
+    async def succeed():
+        return True
+
+    async def fail():
+        raise bot.NetworkError('down')
+
+    async def send_all():
+        scheduler = bot.OutboundScheduler(rate=1000)
+        await scheduler.run('A', 'sendMessage', succeed, (), {})
+        await scheduler.run('A', 'answerCallbackQuery', succeed, (), {})
+        with pytest.raises(bot.NetworkError):
+            await scheduler.run('A', 'sendPhoto', fail, (), {})
+
+    asyncio.run(send_all())
+    assert bot.metrics['messages_sent'] == 1
+    assert bot.metrics['api_calls_in_flight'] == 0
+
+
+def test_stats_escapes_bot_name():
+    request = StubRequest()
+    profile = bot.BotProfile('brand_a', '1:BRAND', admin_id=1)
+    update = message_update(1, 1, '/stats')
+    update['message']['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': 6}]
+
+    async def run():
+        application = bot.build_application(profile, bot.OutboundScheduler(rate=1000), [profile], request)
+        await application.initialize()
+        await application.process_update(Update.de_json(update, application.bot))
+        await application.shutdown()
+
+    asyncio.run(run())
+    (chat_id, text), = request.sent_messages
+    assert text.startswith('📈 *Bot Statistics (brand\\_a)*')
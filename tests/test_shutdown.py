@@ -0,0 +1,174 @@
+import asyncio
+import os
+import signal
+import time
+
+from telegram import Update
+
+import bot
+from stub_request import StubRequest, callback_update, message_update
+
+CORRECT = "✅ Correct!"
+
+
+def credits_confirmed(request, user_id):
+    return sum(1 for chat_id, text in request.sent_messages if chat_id == user_id and text.startswith(CORRECT))
+
+
+def test_sigterm_mid_load_loses_no_credits():
+    request = StubRequest(latency=0.005)
+    profile = bot.BotProfile('load', '1:LOAD', admin_id=1)
+    users = range(100, 105)
+    signalled_at = {}
+
+    async def simulate_users():
+        update_id = 0
+
+        def feed(user_id, text):
+            nonlocal update_id
+            update_id += 1
+            request.feed(message_update(update_id, user_id, text))
+
+        for user_id in users:
+            feed(user_id, "▶️ Start Work")
+        answered = {}
+        give_up = time.monotonic() + 30
+        while time.monotonic() < give_up:
+            # Every user answers each new CAPTCHA as soon as it is shown
+            for user_id in users:
+                captcha_text = profile.active_captchas.get(user_id)
+                if captcha_text and answered.get(user_id) != captcha_text:
+                    answered[user_id] = captcha_text
+                    feed(user_id, captcha_text)
+            confirmed = sum(credits_confirmed(request, user_id) for user_id in users)
+            if not signalled_at and confirmed >= 10:
+                signalled_at['confirmed'] = confirmed
+                signalled_at['time'] = time.monotonic()
+                os.kill(os.getpid(), signal.SIGTERM)
+            if signalled_at and time.monotonic() > signalled_at['time'] + 0.5:
+                return
+            await asyncio.sleep(0.005)
+
+    async def run():
+        await asyncio.gather(bot.run_bots([profile], request), simulate_users())
+
+    asyncio.run(run())
+
+    assert signalled_at, "load never reached the point where SIGTERM is sent"
+    restored = bot.BotProfile('load', '1:LOAD', admin_id=1)
+    assert bot.load_state(restored)
+    assert restored.check_aggregates() == []
+    total = 0
+    for user_id in users:
+        confirmed = credits_confirmed(request, user_id)
+        assert restored.user_balances.get(user_id, 0) == confirmed * profile.reward_per_captcha
+        total += confirmed
+    assert total >= signalled_at['confirmed']
+
+
+def test_deadline_stops_handlers_before_flush(monkeypatch):
+    monkeypatch.setattr(bot, 'SHUTDOWN_DEADLINE', 0.2)
+    request = StubRequest()
+    profile = bot.BotProfile('slow', '1:SLOW', admin_id=1)
+    for user_id in (100, 101):
+        profile.set_work_state(user_id, True)
+        profile.active_captchas[user_id] = 'ABC123'
+
+    async def run():
+        application = bot.build_application(profile, bot.OutboundScheduler(rate=1000), [profile], request)
+        await application.initialize()
+        await application.start()
+        request.latency = 0.5  # Every send now outlasts the deadline
+        for update_id, user_id in enumerate((100, 101), start=1):
+            await application.update_queue.put(
+                Update.de_json(message_update(update_id, user_id, 'ABC123'), application.bot)
+            )
+        await asyncio.sleep(0.05)
+        started = time.monotonic()
+        await bot.shutdown_bots([application], [profile])
+        assert time.monotonic() - started < 2
+        # Nothing may change after the flush, even once the slow sends would have returned
+        await asyncio.sleep(1.5)
+
+    asyncio.run(run())
+
+    restored = bot.BotProfile('slow', '1:SLOW', admin_id=1)
+    assert bot.load_state(restored)
+    assert not profile.accepting_updates
+    assert restored.user_balances == profile.user_balances == {100: profile.reward_per_captcha}
+
+
+def test_admin_decision_is_flushed_immediately():
+    request = StubRequest()
+    profile = bot.BotProfile('admin', '1:ADMIN', admin_id=1)
+    profile.set_balance(5, 500)
+    profile.add_pending_withdrawal(5, {
+        'amount': 500, 'final_amount': 500, 'method': 'payeer', 'address': 'P1234567',
+        'user': bot.User(5, 'user5', False),
+    })
+    asyncio.run(bot.save_state(profile))  # The snapshot taken before the approval
+    with open(bot.state_path(profile), 'rb') as state_file:
+        snapshot = state_file.read()
+
+    async def run():
+        application = bot.build_application(profile, bot.OutboundScheduler(rate=1000), [profile], request)
+        await application.initialize()
+        await application.process_update(Update.de_json(callback_update(1, 1, 7, 'approve_5'), application.bot))
+        await application.shutdown()
+
+    asyncio.run(run())
+
+    # The decision is journaled rather than rewriting the whole snapshot
+    with open(bot.state_path(profile), 'rb') as state_file:
+        assert state_file.read() == snapshot
+    assert os.path.exists(bot.journal_path(profile))
+
+    # A crash now must not resurrect the approved request or its balance
+    restored = bot.BotProfile('admin', '1:ADMIN', admin_id=1)
+    assert bot.load_state(restored)
+    assert restored.user_balances == {5: 0}
+    assert restored.pending_withdrawals == {}
+
+
+def test_journal_replays_only_decisions_newer_than_the_snapshot():
+    profile = bot.BotProfile('journal', '1:JOURNAL', admin_id=1)
+    profile.set_balance(5, 500)
+    profile.set_balance(6, 300)
+    for user_id, amount in ((5, 500), (6, 300)):
+        profile.add_pending_withdrawal(user_id, {
+            'amount': amount, 'final_amount': amount, 'method': 'payeer', 'address': 'P1234567',
+            'user': bot.User(user_id, f'user{user_id}', False),
+        })
+
+    # User 5 is paid and earns 20 more before a snapshot, then user 6 is rejected after it
+    profile.remove_pending_withdrawal(5)
+    profile.set_balance(5, 0)
+    bot.journal_decision(profile, 5, 0)
+    profile.set_balance(5, 20)
+    bot.write_snapshot(bot.state_path(profile), profile.to_snapshot())
+    profile.remove_pending_withdrawal(6)
+    profile.set_balance(6, 300)
+    bot.journal_decision(profile, 6, 300)
+    with open(bot.journal_path(profile), 'a') as journal:
+        journal.write('{"seq":3,"user_')  # Torn by a crash
+
+    restored = bot.BotProfile('journal', '1:JOURNAL', admin_id=1)
+    assert bot.load_state(restored)
+    assert restored.user_balances == {5: 20, 6: 300}
+    assert restored.pending_withdrawals == {}
+    assert restored.journal_seq == 2
+    assert restored.check_aggregates() == []
+
+
+def test_snapshot_retires_the_journal_it_covers():
+    profile = bot.BotProfile('retire', '1:RETIRE', admin_id=1)
+    profile.set_balance(5, 0)
+    bot.journal_decision(profile, 5, 0)
+    assert asyncio.run(bot.save_state(profile))
+    assert not os.path.exists(bot.journal_path(profile))
+
+    # The sequence carries on from the snapshot, so later records are not mistaken for replayed ones
+    restored = bot.BotProfile('retire', '1:RETIRE', admin_id=1)
+    assert bot.load_state(restored)
+    bot.journal_decision(restored, 5, 0)
+    assert restored.journal_seq == 2